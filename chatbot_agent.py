@@ -3,10 +3,16 @@ Car Service Chatbot using OpenAI Agent SDK with Gemini Model
 """
 import os
 import asyncio
+import contextlib
+import functools
+from collections import deque
+from typing import AsyncIterator
+import litellm
 from dotenv import load_dotenv
 from agents import Agent, Runner
 from agents.extensions.models.litellm_model import LitellmModel
 from agents.mcp import MCPServerStdio
+from openai.types.responses import ResponseTextDeltaEvent
 
 # Load environment variables
 load_dotenv()
@@ -19,12 +25,96 @@ if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY environment variable not found. Please check your .env file.")
 
 
+# Static system instructions using PSTO (Persona-Situation-Task-Output) format.
+# Kept free of per-day values so the system prompt is a stable, cacheable prefix.
+_INSTRUCTIONS = """
+## PERSONA
+You are CarBot, a helpful and professional car service booking assistant at an automotive service center. You are friendly, efficient, and always prioritize customer convenience.
+
+## SITUATION
+- Today's date is given in a separate context message
+- Shop hours: 9 AM - 6 PM
+- Slots: 9 AM, 11 AM, 1 PM, 3 PM, 5 PM (every 2 hours)
+- Some slots may be booked
+- NEVER guess availability - always check the system
+- NEVER mention tools, APIs, MCP, SDKs, technical details, or how you work internally
+- If asked about your technical setup, politely redirect to booking services
+
+## TASK
+**BEFORE responding, ALWAYS:**
+1. Review the earlier messages in this conversation to see what has already been discussed
+2. Check what information the customer has ALREADY PROVIDED
+3. Continue from where the conversation left off - DO NOT restart or repeat questions
+
+When a customer wants to book a service:
+1. Ask preferred date (today/tomorrow/specific)
+2. Check availability for that date
+3. Show available time slots
+4. If none available, suggest another date
+5. Ask customer to select a time
+6. Collect information PROGRESSIVELY:
+   - If customer provides name only → acknowledge name, ask for remaining (phone, car, service)
+   - If customer provides name + phone → acknowledge both, ask for remaining (car, service)
+   - If customer provides all at once → acknowledge all and confirm
+7. Show collected information and ask for confirmation
+8. If confirmed, book the appointment
+9. Share booking confirmation with ticket details
+
+## OUTPUT
+Format your responses as follows:
+
+**When asking for customer information:**
+Please provide the following details:
+• Your name
+• Phone number
+• Car model
+• Service type
+
+**When confirming details before booking:**
+Please confirm your booking details:
+👤 Name: John Doe
+📞 Phone: 923001234567
+🚗 Car: Honda Civic 2024
+🔧 Service: Oil Change
+📅 Date: 2025-12-31
+⏰ Time: 03:00 PM
+Is this correct?
+
+**When booking is confirmed:**
+✅ Booking Confirmed!
+🎫 Ticket ID: ABC12345
+👤 Name: John Doe
+📞 Phone: 923001234567
+🚗 Car: Honda Civic 2024
+🔧 Service: Oil Change
+📅 Date: 2025-12-31
+⏰ Time: 03:00 PM
+If you’d like me to help with anything else, feel free to ask. I’m here to help.
+
+Keep responses concise, friendly, and helpful.
+"""
+
+# Maximum number of history messages sent to the model per turn
+MAX_HISTORY_MESSAGES = 20
+
+# Daily-varying context, sent as its own message after the static system prompt
+_CONTEXT_TEMPLATE = "Today: {today} ({dow})"
+
+
+@functools.lru_cache(maxsize=1)
+def _render_context(today: str, dow: str) -> str:
+    """Render the daily context once per date so every instance shares the same string."""
+    return _CONTEXT_TEMPLATE.format(today=today, dow=dow)
+
+
 class CarServiceChatbot:
     """
     Uses Gemini model with OpenAI Agent SDK.
     Integrates FastAPI tools via MCP server.
     """
 
+    static_instructions = _INSTRUCTIONS
+
     def __init__(self):
         from datetime import datetime
 
@@ -35,80 +125,19 @@ class CarServiceChatbot:
         )
 
         # Get current date
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        current_day = datetime.now().strftime("%A")
-
-        # System instructions using PSTO (Persona-Situation-Task-Output) format
-        self.instructions = f"""
-        ## PERSONA
-        You are CarBot, a helpful and professional car service booking assistant at an automotive service center. You are friendly, efficient, and always prioritize customer convenience.
-
-        ## SITUATION
-        - Today: {current_date} ({current_day})
-        - Shop hours: 9 AM - 6 PM
-        - Slots: 9 AM, 11 AM, 1 PM, 3 PM, 5 PM (every 2 hours)
-        - Some slots may be booked
-        - NEVER guess availability - always check the system
-        - NEVER mention tools, APIs, MCP, SDKs, technical details, or how you work internally
-        - If asked about your technical setup, politely redirect to booking services
-
-        ## TASK
-        **BEFORE responding, ALWAYS:**
-        1. Review the PREVIOUS CONVERSATION to see what has already been discussed
-        2. Check what information the customer has ALREADY PROVIDED
-        3. Continue from where the conversation left off - DO NOT restart or repeat questions
-
-        When a customer wants to book a service:
-        1. Ask preferred date (today/tomorrow/specific)
-        2. Check availability for that date
-        3. Show available time slots
-        4. If none available, suggest another date
-        5. Ask customer to select a time
-        6. Collect information PROGRESSIVELY:
-           - If customer provides name only → acknowledge name, ask for remaining (phone, car, service)
-           - If customer provides name + phone → acknowledge both, ask for remaining (car, service)
-           - If customer provides all at once → acknowledge all and confirm
-        7. Show collected information and ask for confirmation
-        8. If confirmed, book the appointment
-        9. Share booking confirmation with ticket details
-
-        ## OUTPUT
-        Format your responses as follows:
-
-        **When asking for customer information:**
-        Please provide the following details:
-        • Your name
-        • Phone number
-        • Car model
-        • Service type
-
-        **When confirming details before booking:**
-        Please confirm your booking details:
-        👤 Name: John Doe
-        📞 Phone: 923001234567
-        🚗 Car: Honda Civic 2024
-        🔧 Service: Oil Change
-        📅 Date: 2025-12-31
-        ⏰ Time: 03:00 PM
-        Is this correct?
-
-        **When booking is confirmed:**
-        ✅ Booking Confirmed!
-        🎫 Ticket ID: ABC12345
-        👤 Name: John Doe
-        📞 Phone: 923001234567
-        🚗 Car: Honda Civic 2024
-        🔧 Service: Oil Change
-        📅 Date: 2025-12-31
-        ⏰ Time: 03:00 PM
-        If you’d like me to help with anything else, feel free to ask. I’m here to help.
-
-        Keep responses concise, friendly, and helpful.
-        """
+        now = datetime.now()
+        current_date = now.strftime("%Y-%m-%d")
+        current_day = now.strftime("%A")
+
+        # Daily-varying context, sent as its own message after the static system prompt
+        self.context_message = {
+            "role": "system",
+            "content": _render_context(current_date, current_day),
+        }
     
         self.agent = None
         self.mcp_server = None
-        self.conversation_history = []  # Track conversation history
+        self.conversation_history = deque()  # Track conversation history, see _trim_history()
 
     async def initialize(self):
         """Initialize agent with MCP server connection."""
@@ -124,14 +153,26 @@ class CarServiceChatbot:
                 },
             )
 
-            # Initialize MCP server
-            await self.mcp_server.__aenter__()
+            # Warm up the model connection while the MCP server starts. The MCP
+            # server must be entered in this task (its anyio task groups have to
+            # be exited by the same task in cleanup()), so only the warmup runs
+            # as a separate task.
+            warmup = asyncio.create_task(self._warmup_model())
+            try:
+                await self.mcp_server.__aenter__()
+            except BaseException:
+                # Don't hold up the startup error on a slow provider call
+                warmup.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await warmup
+                raise
+            await warmup
 
             # Create agent with Gemini model and MCP tools
             self.agent = Agent(
                 name="CarBot",
                 model=self.model,
-                instructions=self.instructions,
+                instructions=self.static_instructions,
                 mcp_servers=[self.mcp_server],
             )
 
@@ -140,39 +181,74 @@ class CarServiceChatbot:
             print(f"💡 Make sure FastAPI server is running at {FASTAPI_URL}")
             raise
 
+    async def _warmup_model(self):
+        """Send a tiny completion so the provider connection is ready before the first turn."""
+        try:
+            await litellm.acompletion(
+                model=GEMINI_MODEL,
+                api_key=GEMINI_API_KEY,
+                messages=[{"role": "user", "content": "ping"}],
+                max_tokens=1,
+            )
+        except Exception:
+            # Warmup is best-effort; the first real turn will surface any errors
+            pass
+
+    def _trim_history(self):
+        """Drop the oldest user/assistant pairs once history exceeds MAX_HISTORY_MESSAGES.
+
+        History stays append-only (and prefix-cacheable) until the window fills;
+        after that the oldest turns drop off each turn and prefix caching stops hitting.
+        """
+        while len(self.conversation_history) > MAX_HISTORY_MESSAGES:
+            self.conversation_history.popleft()
+            self.conversation_history.popleft()
+
+        # Always start with a user turn, even if an errored turn left a user
+        # message without a reply
+        while self.conversation_history and self.conversation_history[0]["role"] != "user":
+            self.conversation_history.popleft()
+
     async def chat(self, user_message: str) -> str:
+        """Return the full response for a message (see chat_stream for incremental output)."""
+        return "".join([chunk async for chunk in self.chat_stream(user_message)])
+
+    async def chat_stream(self, user_message: str) -> AsyncIterator[str]:
+        """Yield response text as it is generated so the first tokens show up immediately."""
         if not self.agent:
             raise RuntimeError("Agent not initialized. Call initialize() first.")
 
         try:
             # Add user message to conversation history
             self.conversation_history.append({"role": "user", "content": user_message})
+            self._trim_history()
 
-            # Build context from conversation history
-            context_messages = "\n".join([
-                f"{'User' if msg['role'] == 'user' else 'CarBot'}: {msg['content']}"
-                for msg in self.conversation_history[-10:]  # Keep last 10 messages
-            ])
-
-            # Create message with context
-            full_message = f"Previous conversation:\n{context_messages}\n\nCurrent message: {user_message}" if len(self.conversation_history) > 1 else user_message
-
-            # Run agent with user message
-            result = await Runner.run(
+            # Send history as discrete messages so the prompt prefix stays
+            # append-only across turns and provider prompt caching can hit
+            result = Runner.run_streamed(
                 self.agent,
-                full_message,
+                [self.context_message, *self.conversation_history],
             )
 
-            # Extract final output
-            response = result.final_output
+            # Forward text deltas as they arrive
+            streamed = []
+            async for event in result.stream_events():
+                if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                    streamed.append(event.data.delta)
+                    yield event.data.delta
+
+            # Record exactly what the user saw, which on tool-calling turns can
+            # include text emitted before the tool call, not just the final output
+            response = "".join(streamed)
+            if not response:
+                response = str(result.final_output)
+                yield response
 
             # Add assistant response to conversation history
             self.conversation_history.append({"role": "assistant", "content": response})
 
-            return response
-
         except Exception as e:
-            return f"Error: {str(e)}"
+            yield f"Error: {str(e)}"
 
     async def cleanup(self):
         """Cleanup resources."""
@@ -203,9 +279,9 @@ async def main():
 
             # Get response from agent
             print("\nCarBot: ", end="", flush=True)
-            response = await chatbot.chat(user_input)
-            print(response)
-            print()
+            async for chunk in chatbot.chat_stream(user_input):
+                print(chunk, end="", flush=True)
+            print("\n")
 
         except KeyboardInterrupt:
             print("\n\nCarBot: Thank you! Come back again. Goodbye! 👋")
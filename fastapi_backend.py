@@ -4,13 +4,53 @@ This server manages slots data and provides REST API endpoints
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Union
+import base64
+import logging
+import os
 import random
-import string
+import secrets
+import sqlite3
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-
-app = FastAPI(title="Car Service Booking API", version="1.0.0")
+from time import monotonic
+import aiosqlite
+import orjson
+
+# Logging level is configurable via LOG_LEVEL (defaults to WARNING for production)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+logger = logging.getLogger("carservice")
+
+# Slots are stored in SQLite (WAL mode) so multiple worker processes share one
+# consistent view of availability
+DB_PATH = os.getenv("SLOTS_DB", "slots.db")
+
+# Per-process database connection, opened in lifespan()
+db: Optional[aiosqlite.Connection] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the database connection for the lifetime of the server process"""
+    global db
+    # Create and seed the slots database before serving requests
+    init_db()
+    # Autocommit mode: each booking UPDATE is its own atomic transaction
+    db = await aiosqlite.connect(DB_PATH, timeout=30, isolation_level=None)
+    try:
+        yield
+    finally:
+        await db.close()
+
+
+app = FastAPI(
+    title="Car Service Booking API",
+    version="1.0.0",
+    lifespan=lifespan,
+)
 
 # Enable CORS
 app.add_middleware(
@@ -21,6 +61,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses such as multi-day slot listings
+app.add_middleware(GZipMiddleware, minimum_size=500)
+
 # Function to generate demo slots for 3 days starting from today
 def generate_demo_slots():
     """Generate slots for today, tomorrow, and day after tomorrow"""
@@ -53,8 +96,63 @@ def generate_demo_slots():
 
     return slots
 
-# Generate demo slots on server start
-demo_slots = generate_demo_slots()
+
+def init_db():
+    """Create the slots table and seed it with demo slots, keeping existing rows"""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS slots (
+                date TEXT NOT NULL,
+                time TEXT NOT NULL,
+                minutes INTEGER NOT NULL,
+                available INTEGER NOT NULL,
+                PRIMARY KEY (date, time)
+            )
+        """)
+        # Dates whose demo bookings have already been applied
+        conn.execute("CREATE TABLE IF NOT EXISTS demo_days (date TEXT PRIMARY KEY)")
+
+        # Times are also stored as minutes since midnight, parsed once here.
+        # INSERT OR IGNORE lets every worker run this without clobbering bookings.
+        slots = generate_demo_slots()
+        rows = []
+        for slot in slots:
+            t = datetime.strptime(slot["time"], "%I:%M %p")
+            rows.append((slot["date"], slot["time"], t.hour * 60 + t.minute, int(slot["available"])))
+        conn.executemany(
+            "INSERT OR IGNORE INTO slots (date, time, minutes, available) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+        # Today's rows were usually seeded two days ago as all-available, so the
+        # first worker to start each day applies today's random demo bookings.
+        # This only books free slots and never releases real bookings.
+        today = slots[0]["date"]
+        cursor = conn.execute("INSERT OR IGNORE INTO demo_days (date) VALUES (?)", (today,))
+        if cursor.rowcount == 1:
+            conn.executemany(
+                "UPDATE slots SET available = 0 WHERE date = ? AND time = ?",
+                [(s["date"], s["time"]) for s in slots if s["date"] == today and not s["available"]],
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+# Serialized /api/slots responses keyed by (date filter, current minute).
+# Entries expire after SLOTS_CACHE_TTL seconds and are cleared on every booking
+# in this process; other workers may serve a listing up to that old, but
+# bookings themselves are always checked against the database.
+SLOTS_CACHE_TTL = 10.0
+# Keys include the client-supplied date, so cap the entry count to keep
+# arbitrary date strings from growing the cache without limit
+SLOTS_CACHE_MAX_ENTRIES = 64
+slots_cache: dict[tuple[Optional[str], str], tuple[float, bytes]] = {}
+
+# Bumped on every booking; a listing is only cached if no booking happened
+# while its query was running, so a stale result can't refill the cache
+slots_cache_version = 0
 
 
 # Pydantic models
@@ -85,6 +183,80 @@ class SlotsResponse(BaseModel):
     slots: List[dict]
 
 
+class SlotUnavailableResponse(BaseModel):
+    success: bool
+    message: str
+    total_slots: int
+    slots: List[dict]
+
+
+# A slot is bookable when it is free and not in the past (past dates and past
+# time slots for today are excluded). Shared by listing and booking so both
+# agree on what "available" means; bind the values from bookable_params().
+BOOKABLE_SQL = "available = 1 AND (date > ? OR (date = ? AND minutes > ?))"
+
+
+def bookable_params() -> list:
+    """Return the current-time values for the BOOKABLE_SQL placeholders"""
+    # Get current date and time
+    now = datetime.now()
+    current_date = now.strftime("%Y-%m-%d")
+    return [current_date, current_date, now.hour * 60 + now.minute]
+
+
+async def filter_available_slots(date: Optional[str] = None) -> List[dict]:
+    """Return available future slots, optionally limited to a single date"""
+    # A date filter uses the (date, time) primary key, so only that day is scanned
+    query = f"SELECT date, time FROM slots WHERE {BOOKABLE_SQL}"
+    params = bookable_params()
+    if date:
+        query += " AND date = ?"
+        params.append(date)
+    query += " ORDER BY date, minutes"
+
+    async with db.execute(query, params) as cursor:
+        rows = await cursor.fetchall()
+
+    return [{"date": d, "time": t, "available": True} for d, t in rows]
+
+
+async def reserve_slot(date: str, time: str) -> bool:
+    """Atomically mark a slot as booked; returns False if it was not available"""
+    global slots_cache_version
+    async with db.execute(
+        f"UPDATE slots SET available = 0 WHERE date = ? AND time = ? AND {BOOKABLE_SQL}",
+        [date, time, *bookable_params()],
+    ) as cursor:
+        booked = cursor.rowcount == 1
+
+    if booked:
+        slots_cache_version += 1
+        slots_cache.clear()
+    return booked
+
+
+def confirm_booking(booking: BookingRequest) -> dict:
+    """Generate a ticket ID and build the confirmation for a booked slot"""
+    # Generate ticket ID: 40 random bits encode to exactly 8 uppercase base32 characters
+    ticket_id = base64.b32encode(secrets.token_bytes(5)).decode()
+    logger.debug("Booking confirmed! Ticket ID: %s", ticket_id)
+
+    return {
+        "success": True,
+        "ticket_id": ticket_id,
+        "customer_name": booking.customer_name,
+        "phone": booking.phone,
+        "car_model": booking.car_model,
+        "service_type": booking.service_type,
+        "date": booking.date,
+        "time": booking.time,
+        "message": f"Booking confirmed! Ticket: {ticket_id}"
+    }
+
+
+# Endpoints stay `async def`: they do no strptime, print or blocking I/O, and
+# aiosqlite runs queries on its own thread, so running them on the event loop
+# is cheaper than dispatching each request to the threadpool.
 @app.get("/", tags=["Health"])
 async def root():
     """Health check endpoint"""
@@ -106,47 +278,36 @@ async def get_available_slots(date: Optional[str] = None):
     Returns:
         JSON object with success status, total count, and array of available slots
     """
-    # Get current date and time
-    now = datetime.now()
-    current_date = now.strftime("%Y-%m-%d")
-    current_time = now.strftime("%I:%M %p")
-
-    print(f"[FastAPI] get_available_slots called - Current time: {current_date} {current_time}")
-
-    # Filter available slots
-    slots = [s for s in demo_slots if s["available"]]
-    print(f"[FastAPI] Available slots before time filter: {len(slots)}")
-
-    # Filter out past time slots for today
-    filtered_slots = []
-    for slot in slots:
-        if slot["date"] == current_date:
-            # Parse slot time and current time for comparison
-            slot_time = datetime.strptime(slot["time"], "%I:%M %p")
-            now_time = datetime.strptime(current_time, "%I:%M %p")
-
-            # Only include future time slots for today
-            if slot_time.time() > now_time.time():
-                filtered_slots.append(slot)
-        else:
-            # Include all slots for future dates
-            filtered_slots.append(slot)
-
-    slots = filtered_slots
-    print(f"[FastAPI] Slots after time filter: {len(slots)}")
-
-    # Apply date filter if provided
-    if date:
-        slots = [s for s in slots if s["date"] == date]
-        print(f"[FastAPI] Slots after date filter ({date}): {len(slots)}")
-
-    print(f"[FastAPI] Returning {len(slots)} slots")
-
-    return {
+    logger.debug("get_available_slots called - date filter: %s", date)
+
+    # Serve a recent identical response from the cache if there is one
+    minute = datetime.now().strftime("%Y-%m-%d %H:%M")
+    cache_key = (date, minute)
+    cached = slots_cache.get(cache_key)
+    if cached and monotonic() - cached[0] < SLOTS_CACHE_TTL:
+        logger.debug("Returning cached slots response")
+        return Response(content=cached[1], media_type="application/json")
+
+    version = slots_cache_version
+    slots = await filter_available_slots(date)
+    logger.debug("Returning %s slots", len(slots))
+
+    # Serialize once so the same bytes can be served from the cache
+    body = orjson.dumps({
         "success": True,
         "total_slots": len(slots),
         "slots": slots
-    }
+    })
+
+    # Skip caching if a booking landed while the query was running
+    if version == slots_cache_version:
+        # Drop entries from earlier minutes so the cache stays small
+        for key in [k for k in slots_cache if k[1] != minute]:
+            del slots_cache[key]
+        if len(slots_cache) < SLOTS_CACHE_MAX_ENTRIES:
+            slots_cache[cache_key] = (monotonic(), body)
+
+    return Response(content=body, media_type="application/json")
 
 
 @app.post("/api/book", response_model=BookingResponse, tags=["Booking"])
@@ -166,41 +327,56 @@ async def book_car_service(booking: BookingRequest):
     date = booking.date
     time = booking.time
 
-    print(f"[FastAPI] Booking request for {date} at {time}")
+    logger.debug("Booking request for %s at %s", date, time)
 
-    # Find slot
-    slot_found = False
-    for slot in demo_slots:
-        if slot["date"] == date and slot["time"] == time and slot["available"]:
-            slot["available"] = False
-            slot_found = True
-            print(f"[FastAPI] Slot marked as booked: {date} {time}")
-            break
-
-    if not slot_found:
-        print(f"[FastAPI] Slot not available: {date} {time}")
+    # Mark slot booked atomically
+    if not await reserve_slot(date, time):
+        logger.debug("Slot not available: %s %s", date, time)
         raise HTTPException(
             status_code=400,
             detail=f"Slot not available for {date} at {time}"
         )
+    logger.debug("Slot marked as booked: %s %s", date, time)
+
+    return confirm_booking(booking)
 
-    # Generate ticket ID
-    ticket_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-    print(f"[FastAPI] Booking confirmed! Ticket ID: {ticket_id}")
+
+@app.post(
+    "/api/check_and_book",
+    response_model=Union[BookingResponse, SlotUnavailableResponse],
+    tags=["Booking"],
+)
+async def check_and_book(booking: BookingRequest):
+    """
+    Check slot availability and book it in a single call
+
+    Args:
+        booking: BookingRequest object with customer details and slot information
+
+    Returns:
+        Booking confirmation with ticket ID and details if the slot was free,
+        otherwise success=False with the currently available slots for that date
+    """
+    date = booking.date
+    time = booking.time
+
+    logger.debug("Check-and-book request for %s at %s", date, time)
+
+    if await reserve_slot(date, time):
+        logger.debug("Slot marked as booked: %s %s", date, time)
+        return confirm_booking(booking)
+
+    slots = await filter_available_slots(date)
+
+    logger.debug("Slot not available: %s %s, %s alternatives", date, time, len(slots))
 
     return {
-        "success": True,
-        "ticket_id": ticket_id,
-        "customer_name": booking.customer_name,
-        "phone": booking.phone,
-        "car_model": booking.car_model,
-        "service_type": booking.service_type,
-        "date": date,
-        "time": time,
-        "message": f"Booking confirmed! Ticket: {ticket_id}"
+        "success": False,
+        "message": f"Slot not available for {date} at {time}",
+        "total_slots": len(slots),
+        "slots": slots
     }
 
-
 if __name__ == "__main__":
     import uvicorn
     print("=" * 60)
@@ -209,4 +385,8 @@ if __name__ == "__main__":
     print("Server URL: http://localhost:8000")
     print("API Docs: http://localhost:8000/docs")
     print("=" * 60)
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Slot state lives in SQLite, so workers share bookings consistently;
+    # run one worker per CPU unless WORKERS is set.
+    # uvicorn[standard] picks uvloop and httptools automatically when available.
+    workers = int(os.getenv("WORKERS", os.cpu_count() or 1))
+    uvicorn.run("fastapi_backend:app", host="0.0.0.0", port=8000, workers=workers)
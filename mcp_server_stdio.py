@@ -3,11 +3,21 @@ MCP Server using stdio transport (works with OpenAI Agent SDK)
 Fetches data from FastAPI backend
 """
 import asyncio
+import functools
 import json
+import logging
+import os
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 import httpx
+import orjson
+from datetime import datetime
+
+# Logging goes to stderr so it never interferes with the stdio transport;
+# level is configurable via LOG_LEVEL (defaults to WARNING)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+logger = logging.getLogger("carservice.mcp")
 
 # Create MCP server
 app = Server("car-service-mcp")
@@ -15,6 +25,62 @@ app = Server("car-service-mcp")
 # FastAPI backend URL
 FASTAPI_BASE_URL = "http://localhost:8000"
 
+# Shared HTTP client, reused across tool calls to keep connections pooled
+client = httpx.AsyncClient(
+    base_url=FASTAPI_BASE_URL,
+    timeout=10.0,
+    limits=httpx.Limits(max_keepalive_connections=20),
+)
+
+# Input schema shared by the booking tools
+BOOKING_INPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "customer_name": {
+            "type": "string",
+            "description": "Full name of the customer (e.g., 'John Doe')"
+        },
+        "phone": {
+            "type": "string",
+            "description": "Customer's phone number with country code (e.g., '+1 123-456-7890')"
+        },
+        "car_model": {
+            "type": "string",
+            "description": "Make and model of the car with year (e.g., 'Honda Civic 2024')"
+        },
+        "service_type": {
+            "type": "string",
+            "description": "Type of service needed (e.g., 'Oil Change', 'Full Service', 'Brake Check', 'Tire Rotation')"
+        },
+        "date": {
+            "type": "string",
+            "description": "Appointment date in YYYY-MM-DD format (e.g., '2025-12-31')"
+        },
+        "time": {
+            "type": "string",
+            "description": "Appointment time in HH:MM AM/PM format (e.g., '03:00 PM'). Must match an available slot."
+        }
+    },
+    "required": ["customer_name", "phone", "car_model", "service_type", "date", "time"]
+}
+
+
+@functools.lru_cache(maxsize=128)
+def normalize_date(value: str) -> str:
+    """Validate a date and return it in zero-padded YYYY-MM-DD form, memoized per string"""
+    return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+
+
+def invalid_date_response(value: str) -> list[TextContent]:
+    """Error returned to the agent when a date argument is malformed"""
+    return [TextContent(
+        type="text",
+        text=json.dumps({
+            "success": False,
+            "error": f"Invalid date '{value}', expected YYYY-MM-DD format"
+        })
+    )]
+
 
 @app.list_tools()
 async def list_tools() -> list[Tool]:
@@ -41,36 +107,14 @@ async def list_tools() -> list[Tool]:
             description=(
                 """Creates a new car service booking appointment with customer details and generates a unique ticket ID. Validates that the requested slot is available before booking. Returns booking confirmation with ticket ID, customer info, and appointment details. Use this tool ONLY after collecting all required customer information and confirming their preferred slot."""
             ),
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "customer_name": {
-                        "type": "string",
-                        "description": "Full name of the customer (e.g., 'John Doe')"
-                    },
-                    "phone": {
-                        "type": "string",
-                        "description": "Customer's phone number with country code (e.g., '+1 123-456-7890')"
-                    },
-                    "car_model": {
-                        "type": "string",
-                        "description": "Make and model of the car with year (e.g., 'Honda Civic 2024')"
-                    },
-                    "service_type": {
-                        "type": "string",
-                        "description": "Type of service needed (e.g., 'Oil Change', 'Full Service', 'Brake Check', 'Tire Rotation')"
-                    },
-                    "date": {
-                        "type": "string",
-                        "description": "Appointment date in YYYY-MM-DD format (e.g., '2025-12-31')"
-                    },
-                    "time": {
-                        "type": "string",
-                        "description": "Appointment time in HH:MM AM/PM format (e.g., '03:00 PM'). Must match an available slot."
-                    }
-                },
-                "required": ["customer_name", "phone", "car_model", "service_type", "date", "time"]
-            }
+            inputSchema=BOOKING_INPUT_SCHEMA
+        ),
+        Tool(
+            name="check_and_book",
+            description=(
+                """Re-checks that the requested slot is still available and books it in a single step, generating a unique ticket ID. Returns booking confirmation with ticket ID, customer info, and appointment details on success. If the slot has been taken, returns success false with the currently available slots for that date so an alternative can be offered. Prefer this over book_car_service once all customer details are collected and the slot is confirmed."""
+            ),
+            inputSchema=BOOKING_INPUT_SCHEMA
         )
     ]
 
@@ -79,27 +123,36 @@ async def list_tools() -> list[Tool]:
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
     """Handle tool execution - fetches data from FastAPI backend"""
 
+    # Reject malformed dates before making a round trip to the backend, and
+    # forward the canonical form (e.g. '2025-1-2' -> '2025-01-02') so it
+    # matches the backend's stored dates
+    if arguments.get("date"):
+        try:
+            arguments = {**arguments, "date": normalize_date(arguments["date"])}
+        except (TypeError, ValueError):
+            logger.debug("Invalid date argument: %s", arguments["date"])
+            return invalid_date_response(arguments["date"])
+
     if name == "get_available_slots":
         try:
             # Call FastAPI backend
-            async with httpx.AsyncClient() as client:
-                params = {}
-                if "date" in arguments and arguments["date"]:
-                    params["date"] = arguments["date"]
-
-                print(f"[MCP] Calling FastAPI: GET {FASTAPI_BASE_URL}/api/slots with params: {params}")
-                response = await client.get(f"{FASTAPI_BASE_URL}/api/slots", params=params)
-                response.raise_for_status()
-
-                result = response.json()
-                print(f"[MCP] FastAPI returned {result['total_slots']} slots")
-
-                return [TextContent(
-                    type="text",
-                    text=json.dumps(result, indent=2)
-                )]
+            params = {}
+            if "date" in arguments and arguments["date"]:
+                params["date"] = arguments["date"]
+
+            logger.debug("Calling FastAPI: GET %s/api/slots with params: %s", FASTAPI_BASE_URL, params)
+            response = await client.get("/api/slots", params=params)
+            response.raise_for_status()
+
+            result = orjson.loads(response.content)
+            logger.debug("FastAPI returned %s slots", result['total_slots'])
+
+            return [TextContent(
+                type="text",
+                text=orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
+            )]
         except Exception as e:
-            print(f"[MCP] Error calling FastAPI: {e}")
+            logger.error("Error calling FastAPI: %s", e)
             return [TextContent(
                 type="text",
                 text=json.dumps({
@@ -111,29 +164,28 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
     elif name == "book_car_service":
         try:
             # Call FastAPI backend
-            async with httpx.AsyncClient() as client:
-                booking_data = {
-                    "customer_name": arguments["customer_name"],
-                    "phone": arguments["phone"],
-                    "car_model": arguments["car_model"],
-                    "service_type": arguments["service_type"],
-                    "date": arguments["date"],
-                    "time": arguments["time"]
-                }
+            booking_data = {
+                "customer_name": arguments["customer_name"],
+                "phone": arguments["phone"],
+                "car_model": arguments["car_model"],
+                "service_type": arguments["service_type"],
+                "date": arguments["date"],
+                "time": arguments["time"]
+            }
 
-                print(f"[MCP] Calling FastAPI: POST {FASTAPI_BASE_URL}/api/book")
-                response = await client.post(f"{FASTAPI_BASE_URL}/api/book", json=booking_data)
-                response.raise_for_status()
+            logger.debug("Calling FastAPI: POST %s/api/book", FASTAPI_BASE_URL)
+            response = await client.post("/api/book", json=booking_data)
+            response.raise_for_status()
 
-                result = response.json()
-                print(f"[MCP] Booking successful! Ticket: {result['ticket_id']}")
+            result = orjson.loads(response.content)
+            logger.debug("Booking successful! Ticket: %s", result['ticket_id'])
 
-                return [TextContent(
-                    type="text",
-                    text=json.dumps(result, indent=2)
-                )]
+            return [TextContent(
+                type="text",
+                text=orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
+            )]
         except httpx.HTTPStatusError as e:
-            print(f"[MCP] Booking failed: {e.response.text}")
+            logger.warning("Booking failed: %s", e.response.text)
             error_detail = e.response.json().get("detail", str(e))
             return [TextContent(
                 type="text",
@@ -143,7 +195,36 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
                 })
             )]
         except Exception as e:
-            print(f"[MCP] Error calling FastAPI: {e}")
+            logger.error("Error calling FastAPI: %s", e)
+            return [TextContent(
+                type="text",
+                text=json.dumps({
+                    "success": False,
+                    "error": f"Failed to book service: {str(e)}"
+                })
+            )]
+
+    elif name == "check_and_book":
+        try:
+            # Call FastAPI backend; availability check and booking happen server-side
+            booking_data = {key: arguments[key] for key in BOOKING_INPUT_SCHEMA["required"]}
+
+            logger.debug("Calling FastAPI: POST %s/api/check_and_book", FASTAPI_BASE_URL)
+            response = await client.post("/api/check_and_book", json=booking_data)
+            response.raise_for_status()
+
+            result = orjson.loads(response.content)
+            if result["success"]:
+                logger.debug("Booking successful! Ticket: %s", result['ticket_id'])
+            else:
+                logger.debug("Slot taken, returning %s alternatives", result['total_slots'])
+
+            return [TextContent(
+                type="text",
+                text=orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
+            )]
+        except Exception as e:
+            logger.error("Error calling FastAPI: %s", e)
             return [TextContent(
                 type="text",
                 text=json.dumps({
@@ -157,12 +238,15 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
 
 async def main():
     """Run MCP server with stdio transport"""
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            app.create_initialization_options()
-        )
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                app.create_initialization_options()
+            )
+    finally:
+        await client.aclose()
 
 
 if __name__ == "__main__":